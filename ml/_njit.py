@@ -0,0 +1,23 @@
+# ml/_njit.py
+# numba is optional: without it the decorated functions just run as plain Python.
+try:
+    from numba import get_num_threads, njit, prange, set_num_threads
+except ImportError:
+    prange = range
+
+    def get_num_threads():
+        return 1
+
+    def set_num_threads(n):
+        pass
+
+    def njit(*args, **kwargs):
+        # Supports both @njit and @njit(cache=True, ...)
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+
+        def decorator(func):
+            return func
+        return decorator
+
+__all__ = ['get_num_threads', 'njit', 'prange', 'set_num_threads']
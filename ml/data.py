@@ -1,115 +1,234 @@
 # ml/data.py
 import os
+import hashlib
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+from pyarrow import csv as pv
+from joblib import Memory
+from numpy.lib.stride_tricks import sliding_window_view
+
+from ml._njit import njit
+
+CACHE_DIR = "cache"
+memory = Memory(CACHE_DIR, verbose=0)
+# Rows used by process_last_row(): the 20-day windows only need 20, the rest is warm-up for the
+# Wilder/EWM averages (ATR_14, RSI_14), which depend on the whole history. After 100 rows their
+# start-up weight is under 0.2%, so the last row's values are close to (not exactly) full-history ones.
+LAST_ROW_LOOKBACK = 100
 
 
 def load_csv(filename: str) -> pd.DataFrame:
-    return pd.read_csv(filename)
+    # pyarrow's multithreaded parser; Date stays a string column, as with pd.read_csv
+    table = pv.read_csv(filename, convert_options=pv.ConvertOptions(column_types={'Date': pa.string()}))
+    return table.to_pandas()
 
-def process_data(df: pd.DataFrame) -> pd.DataFrame:
+def _rolling_stats(values: np.ndarray, window: int, std: bool = False):
     """
-    Quantitative Metrics:
-    - PRICE:
-        - % change in ADJUSTED closing
-        - % change in 3 days
-        - Ma5 & Ma20
-        - Close : Ma5 & Close : Ma20
-        - Ma5 - Ma20
-        - Range Ratio (High - Low) / Closing
-    - VOLUME:
-        - % change in volume
-        - Va5 & Va20 [ volume moving avg ]
-        - Volume : Va5 & Volume : Va20
-        - Lagged Volume(3 days)
-    - VOLATILITY:
-        - 5 day Standard Deviation
-        - 14 day ATR
-        - 14 day RSI
-        - 10 day momentum
-    - TARGET:
-        - 1 if Close tmrw > Close today (profit)
-        - 0 if Close tmrw = Close today (Risk Tolerance)
-        - -1 if Close tmrw < Close today
+    Rolling mean (and sample std if std=True) over one strided window view,
+    NaN-padded at the front like pandas' rolling(window).
+    Returns (mean, std), std is None unless requested.
+    """
+    mean = np.full(len(values), np.nan)
+    sd = np.full(len(values), np.nan) if std else None
+    if len(values) >= window:
+        windows = sliding_window_view(values, window)
+        mean[window - 1:] = windows.mean(axis=1)
+        if std:
+            sd[window - 1:] = windows.std(axis=1, ddof=1)
+    return mean, sd
+
+
+@njit(cache=True)
+def _wilder(values, n):
+    """
+    Wilder's smoothing: seeded with the mean of the first n values, then
+    out[i] = (out[i-1] * (n - 1) + values[i]) / n. Output is NaN until the seed is
+    complete; non-finite values are skipped (NaN output) so one bad bar doesn't
+    poison the rest of the series.
+    """
+    out = np.empty_like(values)
+    out[:] = np.nan
+    avg = 0.0
+    count = 0
+    for i in range(len(values)):
+        v = values[i]
+        if not np.isfinite(v):
+            continue
+        if count < n:
+            avg += v
+            count += 1
+            if count == n:
+                avg /= n
+                out[i] = avg
+        else:
+            avg = (avg * (n - 1) + v) / n
+            out[i] = avg
+    return out
+
+
+def _compute_features(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds every feature column and Target to df (see process_data) without dropping any rows.
     """
     df = df.sort_values('Date').reset_index(drop=True)
+    close = df['Adj Close']
+    volume = df['Volume']
+    adj = close.to_numpy(dtype=np.float64)
+    vol = volume.to_numpy(dtype=np.float64)
+    ma5, std5 = _rolling_stats(adj, 5, std=True)
+    ma20, _ = _rolling_stats(adj, 20)
+    va5, _ = _rolling_stats(vol, 5)
+    va20, _ = _rolling_stats(vol, 20)
+
+    # Features are collected here and joined onto df once at the end, instead of
+    # inserting ~25 columns into the frame one at a time.
+    f = {}
 
     # % change in closing price
-    df['Pct_Change_Close'] = df['Adj Close'].pct_change(fill_method=None) * 100
+    f['Pct_Change_Close'] = close.pct_change(fill_method=None) * 100
 
     # % change in closing price over 3 days
-    df['Pct_Change_3d'] = df['Adj Close'].pct_change(periods=3, fill_method=None) * 100
+    f['Pct_Change_3d'] = close.pct_change(periods=3, fill_method=None) * 100
 
     # Moving averages for Close: 5-day and 20-day
-    df['Ma5'] = df['Adj Close'].rolling(window=5).mean()
-    df['Ma20'] = df['Adj Close'].rolling(window=20).mean()
+    f['Ma5'] = pd.Series(ma5, index=df.index)
+    f['Ma20'] = pd.Series(ma20, index=df.index)
 
     # Ratios: Close divided by moving averages
-    df['Close_to_Ma5'] = df['Adj Close'] / df['Ma5']
-    df['Close_to_Ma20'] = df['Adj Close'] / df['Ma20']
+    f['Close_to_Ma5'] = close / f['Ma5']
+    f['Close_to_Ma20'] = close / f['Ma20']
 
     # Difference between Ma5 and Ma20
-    df['Ma5_minus_Ma20'] = df['Ma5'] - df['Ma20']
+    f['Ma5_minus_Ma20'] = f['Ma5'] - f['Ma20']
 
     # Range Ratio: (High - Low) / Close
-    df['Range_Ratio'] = (df['High'] - df['Low']) / df['Adj Close']
+    f['Range_Ratio'] = (df['High'] - df['Low']) / close
 
     # -----------------------
     # VOLUME METRICS
     # -----------------------
     # % change in Volume
-    df['Pct_Change_Volume'] = df['Volume'].pct_change(fill_method=None) * 100
+    f['Pct_Change_Volume'] = volume.pct_change(fill_method=None) * 100
 
     # Moving averages for Volume: 5-day and 20-day
-    df['Va5'] = df['Volume'].rolling(window=5).mean()
-    df['Va20'] = df['Volume'].rolling(window=20).mean()
+    f['Va5'] = pd.Series(va5, index=df.index)
+    f['Va20'] = pd.Series(va20, index=df.index)
 
     # Ratios: Volume divided by its moving averages
-    df['Volume_to_Va5'] = df['Volume'] / df['Va5']
-    df['Volume_to_Va20'] = df['Volume'] / df['Va20']
+    f['Volume_to_Va5'] = volume / f['Va5']
+    f['Volume_to_Va20'] = volume / f['Va20']
 
     # Lagged Volume (3 days ago)
-    df['Lagged_Volume_3d'] = df['Volume'].shift(3)
+    f['Lagged_Volume_3d'] = volume.shift(3)
 
     # -----------------------
     # VOLATILITY METRICS
     # -----------------------
     # 5-day Standard Deviation of closing price
-    df['Std_5d'] = df['Adj Close'].rolling(window=5).std()
+    f['Std_5d'] = pd.Series(std5, index=df.index)
+
+    # Previous day's close, shared by TR and RSI below
+    pc = np.empty_like(adj)
+    pc[:1] = np.nan
+    pc[1:] = adj[:-1]
+    f['Previous_Close'] = pd.Series(pc, index=df.index)
 
-    # ATR (Average True Range) over 14 days
+    # ATR (Average True Range) over 14 days, using Wilder's smoothing
     # True Range (TR) calculation:
-    df['Previous_Close'] = df['Adj Close'].shift(1)
-    df['TR'] = df.apply(
-        lambda row: max(
-            row['High'] - row['Low'],
-            abs(row['High'] - row['Previous_Close']) if pd.notnull(row['Previous_Close']) else 0,
-            abs(row['Low'] - row['Previous_Close']) if pd.notnull(row['Previous_Close']) else 0
-        ),
-        axis=1
-    )
-    df['ATR_14'] = df['TR'].rolling(window=14).mean()
-
-    # RSI (Relative Strength Index) over 14 days
-    delta = df['Adj Close'].diff()
-    gain = delta.clip(lower=0)
-    loss = -delta.clip(upper=0)
-    avg_gain = gain.rolling(window=14, min_periods=14).mean()
-    avg_loss = loss.rolling(window=14, min_periods=14).mean()
+    h = df['High'].to_numpy(dtype=np.float64)
+    l = df['Low'].to_numpy(dtype=np.float64)
+    # fmax ignores the NaN previous close on the first row, so TR falls back to High - Low there
+    tr = np.fmax(h - l, np.fmax(np.abs(h - pc), np.abs(l - pc)))
+    f['TR'] = pd.Series(tr, index=df.index)
+    f['ATR_14'] = pd.Series(_wilder(tr, 14), index=df.index)
+
+    # RSI (Relative Strength Index) over 14 days, using Wilder's smoothing
+    delta = adj - pc
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
+    avg_gain = pd.Series(gain, index=df.index).ewm(alpha=1 / 14, adjust=False, min_periods=14).mean()
+    avg_loss = pd.Series(loss, index=df.index).ewm(alpha=1 / 14, adjust=False, min_periods=14).mean()
     rs = avg_gain / avg_loss
-    df['RSI_14'] = 100 - (100 / (1 + rs))
+    f['RSI_14'] = 100 - (100 / (1 + rs))
 
     # 10-day momentum: difference between today's close and close 10 days ago
-    df['Momentum_10'] = df['Adj Close'] - df['Adj Close'].shift(10)
+    f['Momentum_10'] = close - close.shift(10)
 
     # --------
     # TARGET VARIABLE(y function)
     # --------
-    df['Target'] = np.sign(df['Adj Close'].shift(-1) - df['Adj Close'])
-    df.replace([np.inf, -np.inf], np.nan, inplace=True)
-    df.dropna(inplace=True)
-    return df
+    target = np.empty_like(adj)
+    target[:-1] = np.sign(adj[1:] - adj[:-1])
+    target[-1:] = np.nan
+    f['Target'] = pd.Series(target, index=df.index)
 
-def load_and_process(filename: str) -> pd.DataFrame:
+    return pd.concat([df, pd.DataFrame(f, index=df.index)], axis=1)
+
+
+def _keep_finite_rows(df: pd.DataFrame) -> pd.DataFrame:
+    # Keep only rows where every numeric value is finite (no NaN/inf) and nothing else is missing
+    numeric = df.select_dtypes(include='number')
+    mask = np.isfinite(numeric.to_numpy(dtype=np.float64)).all(axis=1)
+    mask &= df.drop(columns=numeric.columns).notna().all(axis=1).to_numpy()
+    return df.take(np.flatnonzero(mask))
+
+
+def process_data(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Quantitative Metrics:
+    - PRICE:
+        - % change in ADJUSTED closing
+        - % change in 3 days
+        - Ma5 & Ma20
+        - Close : Ma5 & Close : Ma20
+        - Ma5 - Ma20
+        - Range Ratio (High - Low) / Closing
+    - VOLUME:
+        - % change in volume
+        - Va5 & Va20 [ volume moving avg ]
+        - Volume : Va5 & Volume : Va20
+        - Lagged Volume(3 days)
+    - VOLATILITY:
+        - 5 day Standard Deviation
+        - 14 day ATR (Wilder's smoothing)
+        - 14 day RSI
+        - 10 day momentum
+    - TARGET:
+        - 1 if Close tmrw > Close today (profit)
+        - 0 if Close tmrw = Close today (Risk Tolerance)
+        - -1 if Close tmrw < Close today
+    """
+    return _keep_finite_rows(_compute_features(df))
+
+
+def process_last_row(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Features for only the most recent row of df, e.g. today's bar for a live signal
+    (process_data drops that row since its Target is still unknown).
+    Only the last LAST_ROW_LOOKBACK rows are processed, so callers can pass a longer history
+    than that. Returns a 1-row DataFrame without Target, or an empty one if any of that
+    row's features aren't finite.
+    """
+    df = df.sort_values('Date').tail(LAST_ROW_LOOKBACK)
+    row = _compute_features(df).iloc[[-1]].drop(columns='Target')
+    return _keep_finite_rows(row)
+
+
+# Changes to process_data() or its helpers must invalidate cached results too
+with open(__file__, 'rb') as _source:
+    _PROCESS_DATA_HASH = hashlib.md5(_source.read()).hexdigest()
+
+
+@memory.cache
+def _load_and_process_cached(filename: str, mtime: float, process_hash: str) -> pd.DataFrame:
     df = load_csv(filename)
     return process_data(df)
+
+
+def load_and_process(filename: str) -> pd.DataFrame:
+    """
+    Loads and processes a CSV, reusing the cached result as long as the file
+    (by modification time) and process_data() are unchanged.
+    """
+    return _load_and_process_cached(filename, os.path.getmtime(filename), _PROCESS_DATA_HASH)
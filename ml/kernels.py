@@ -0,0 +1,54 @@
+# ml/kernels.py
+import numpy as np
+
+from ml._njit import njit, prange
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def column_stats(X):
+    """
+    Per-column mean and population standard deviation of a 2D array,
+    in one pass per column (Welford). Zero-variance columns get sigma = 1.
+    """
+    n, d = X.shape
+    mu = np.empty(d, np.float32)
+    sigma = np.empty(d, np.float32)
+    for j in prange(d):
+        mean = 0.0
+        m2 = 0.0
+        for i in range(n):
+            x = X[i, j]
+            delta = x - mean
+            mean += delta / (i + 1)
+            m2 += delta * (x - mean)
+        std = np.sqrt(m2 / n) if n > 0 else 0.0
+        mu[j] = mean
+        sigma[j] = std if std > 0 else 1.0
+    return mu, sigma
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def standardize(X, mu, sigma):
+    """
+    (X - mu) / sigma row by row into a new float32 array.
+    """
+    n, d = X.shape
+    out = np.empty((n, d), np.float32)
+    for i in prange(n):
+        for j in range(d):
+            out[i, j] = (X[i, j] - mu[j]) / sigma[j]
+    return out
+
+
+@njit(fastmath=True, cache=True)
+def standardize_serial(X, mu, sigma):
+    """
+    Single-threaded standardize(), for the predictor: its batches are one ticker's rows, and
+    it must not start numba's thread pool in a process that later forks backTest workers.
+    """
+    n, d = X.shape
+    out = np.empty((n, d), np.float32)
+    for i in range(n):
+        for j in range(d):
+            out[i, j] = (X[i, j] - mu[j]) / sigma[j]
+    return out
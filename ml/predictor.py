@@ -1,12 +1,22 @@
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 import joblib
+import numpy as np
 import pandas as pd
 import yfinance as yf
 
 import ml.data as data  # for process_data()
+from ml._njit import njit
 import ml.trainer as trainer
 import datetime
 
+# Optional: faster inference for models with an ONNX export (see trainer.export_onnx)
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
 # The list of sectors (each should have a trained model in Models/)
 STOCK_SECTORS = [
     "Basic Materials",
@@ -42,13 +52,36 @@ FEATURE_COLS = [
     'RSI_14',
     'Momentum_10'
 ]
-sectors = joblib.load('data/ticker_info_cache.joblib')
+PRICE_CACHE_DIR = os.path.join(data.CACHE_DIR, "prices")
+# Calendar days downloaded by realSignal(): ~110 trading days, so process_last_row() gets its
+# full data.LAST_ROW_LOOKBACK rows even around holidays
+REAL_SIGNAL_HISTORY_DAYS = 160
 
 
 # -------------------
 # REAL TIME FUNCTIONS
 # -------------------
+def _price_cache_path(ticker, start, end):
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    return os.path.join(PRICE_CACHE_DIR, f"{ticker}_{start:%Y-%m-%d}_{end:%Y-%m-%d}.parquet")
+
+
+def _is_cacheable(end):
+    # Only windows that are fully in the past are safe to cache; today's bar can still change
+    return pd.Timestamp(end) < pd.Timestamp.today().normalize()
+
+
+def _save_price_cache(ticker, start, end, df):
+    os.makedirs(PRICE_CACHE_DIR, exist_ok=True)
+    df.to_parquet(_price_cache_path(ticker, start, end), index=False)
+
+
 def fetch_adjusted_df(ticker, start, end):
+    cacheable = _is_cacheable(end)
+    cache_path = _price_cache_path(ticker, start, end)
+    if cacheable and os.path.exists(cache_path):
+        return pd.read_parquet(cache_path)
+
     df = yf.download(ticker, start=start, end=end, auto_adjust=True)
     if df.empty:
         print("[WARNING] No data found for ", ticker)
@@ -59,96 +92,186 @@ def fetch_adjusted_df(ticker, start, end):
     df.reset_index(inplace=True)
     # Rename close to adj close
     df.rename(columns={"Close": "Adj Close"}, inplace=True)
+    if cacheable:
+        _save_price_cache(ticker, start, end, df)
     return df
 
 
+def fetch_adjusted_batch(tickers, start, end):
+    """
+    Downloads every ticker in a single yfinance call and splits the result
+    into one frame per ticker (same layout as fetch_adjusted_df).
+    Tickers already in the price cache are read from disk instead.
+    """
+    cacheable = _is_cacheable(end)
+    frames = {}
+    missing = []
+    for ticker in tickers:
+        cache_path = _price_cache_path(ticker, start, end)
+        if cacheable and os.path.exists(cache_path):
+            frames[ticker] = pd.read_parquet(cache_path)
+        else:
+            missing.append(ticker)
+
+    if missing:
+        df_all = yf.download(missing, start=start, end=end, group_by='ticker', threads=True, auto_adjust=True)
+        for ticker in missing:
+            if df_all.empty or ticker not in df_all.columns.get_level_values(0):
+                print("[WARNING] No data found for ", ticker)
+                frames[ticker] = pd.DataFrame()
+                continue
+            # Tickers that failed to download come back as all-NaN columns
+            df = df_all[ticker].dropna(how='all')
+            if df.empty:
+                print("[WARNING] No data found for ", ticker)
+                frames[ticker] = df
+                continue
+            df = df.reset_index().rename(columns={"Close": "Adj Close"})
+            df.columns.name = None
+            if cacheable:
+                _save_price_cache(ticker, start, end, df)
+            frames[ticker] = df
+    return {ticker: frames[ticker] for ticker in tickers}
+
+
 def realSignal(ticker, date):
     """
-    Given a ticker and a date (string in 'YYYY-MM-DD' format), this function:
-      1. Downloads ~60 days of historical data ending on the given date.
-      2. Processes the data (computing moving averages, % changes, etc.) using ml.data.process_data().
-      3. Selects the row corresponding to the given date (or uses the most recent row if not found).
-      4. Determines the ticker’s sector
-      5. Loads the trained model and scaler for that sector from the Models/ folder.
-      6. Scales the features and returns the model’s prediction.
+    Given a ticker and a date (string in 'YYYY-MM-DD' format or a date), this function:
+      1. Downloads REAL_SIGNAL_HISTORY_DAYS calendar days of historical data ending on the given date.
+      2. Computes the features (moving averages, % changes, etc.) for the last row only using
+         ml.data.process_last_row(), i.e. the given date or the most recent trading day before it.
+      3. Determines the ticker’s sector
+      4. Loads the trained model and scaler for that sector from the Models/ folder.
+      5. Scales the features and returns the model’s prediction.
     """
-    start = date - datetime.timedelta(days=60)
-    df = fetch_adjusted_df(ticker, start, start)
-    df = data.process_data(df)
-    sector = trainer.get_ticker_sector(ticker, sectors)
-    df['Date'] = df['Date'].dt.strftime('%Y-%m-%d')
-    return signal(ticker, sector, df, date)
+    date = pd.Timestamp(date)
+    start = date - datetime.timedelta(days=REAL_SIGNAL_HISTORY_DAYS)
+    # yfinance's end date is exclusive
+    df = fetch_adjusted_df(ticker, start, date + datetime.timedelta(days=1))
+    if df.empty:
+        return 0
+    row = data.process_last_row(df)
+    if row.empty:
+        print("[WARNING] Not enough data to compute features for ", ticker)
+        return 0
+    sector = trainer.get_ticker_sector(ticker)
+    return signals(sector, row)[0]
 
 
 # ---------------------
 # BACKTESTING FUNCTIONS
 # ----------------------
 
-def signal(ticker, sector, df: pd.DataFrame, date_str):
-    row = df[df["Date"] == date_str]
-    if row.empty:  # If empty row, use yesterday (Shouldn't happen though)
-        row = df.iloc[[-1]]
-    X = row[FEATURE_COLS]
+class _OnnxModel:
+    """
+    predict()-compatible wrapper around an onnxruntime session for a model exported by
+    trainer.export_onnx(). Runs only the forward pass, without sklearn's per-call overhead.
+    """
+
+    def __init__(self, path):
+        options = ort.SessionOptions()
+        # Batches are one ticker's rows and backTest already runs one process per core
+        options.intra_op_num_threads = 1
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, X):
+        return self.session.run(None, {self.input_name: np.asarray(X, dtype=np.float32)})[0]
+
+
+@lru_cache(maxsize=32)
+def _load_model(sector):
+    """
+    Loads (model, (mu, sigma)) for a sector from Models/ once and keeps them in memory.
+    Older scalers saved as a pickled StandardScaler are still accepted. The model is the
+    ONNX export run through onnxruntime when both exist, else the joblib pickle.
+    Returns (None, None) if either file is missing.
+    """
+    model_path = os.path.join("Models", f"{sector}.joblib")
+    scaler_path = os.path.join("Models", f"{sector}_scaler.npz")
+    legacy_scaler_path = os.path.join("Models", f"{sector}_scaler.joblib")
+    if not os.path.exists(model_path):
+        return None, None
+    if os.path.exists(scaler_path):
+        with np.load(scaler_path) as stats:
+            scaler = (stats['mu'], stats['sigma'])
+    elif os.path.exists(legacy_scaler_path):
+        legacy = joblib.load(legacy_scaler_path)
+        scaler = (legacy.mean_.astype(np.float32), legacy.scale_.astype(np.float32))
+    else:
+        return None, None
+    onnx_path = os.path.join("Models", f"{sector}.onnx")
+    if ort is not None and os.path.exists(onnx_path):
+        return _OnnxModel(onnx_path), scaler
+    return joblib.load(model_path), scaler
+
+
+def date_index(df: pd.DataFrame):
+    """
+    Maps each date in df (as a pd.Timestamp) to its row position, so repeated signal()
+    calls on the same frame don't have to scan the Date column every time.
+    """
+    return {d: i for i, d in enumerate(df['Date'])}
+
+
+def signal(ticker, sector, df: pd.DataFrame, date, date_to_idx=None):
+    if date_to_idx is None:
+        date_to_idx = date_index(df)
+    # If the date is missing, use yesterday (Shouldn't happen though)
+    idx = date_to_idx.get(pd.Timestamp(date), -1)
+    row = df.iloc[[idx]]
+    X = row[FEATURE_COLS].to_numpy(dtype=np.float32)
     if sector not in STOCK_SECTORS:
         sector = "Unknown"
-    model_path = os.path.join("Models", f"{sector}.joblib")
-    scaler_path = os.path.join("Models", f"{sector}_scaler.joblib")
-    if not os.path.exists(model_path) or not os.path.exists(scaler_path):
+    model, scaler = _load_model(sector)
+    if model is None:
         print(f"[ERROR] Model or scaler for sector '{sector}' not found.")
         return 0
-    model = joblib.load(model_path)
-    scaler = joblib.load(scaler_path)
-    X_scaled = scaler.transform(X)
+    X_scaled = trainer.standardize(X, *scaler, parallel=False)
     pred = model.predict(X_scaled)[0]
     return pred
 
 
-def simulate(ticker, start, end):
+def signals(sector, df: pd.DataFrame):
     """
-    Simulates day-by-day trades for a given ticker from a given interval
-
-    Trading Rules:
-      1) If already holding shares:
-         a) If the model prediction is positive, buy additional shares equal to:
-                current_shares * (daily_pct_gain / 100)
-            (e.g. a 20% gain means buying 20% more shares)
-         b) If the prediction is negative, sell all shares.
-      2) If not holding shares:
-         a) If the prediction is positve, buy $1000 worth of shares.
-         b) Otherwise, do nothing.
-      3) If there isn’t enough cash to cover a purchase, “inject” the extra cash and add it to expenses.
-
-    At the end of the simulation any remaining shares are sold.
-    The function returns the profit percentage calculated as:
-         ((final cash - total expenses) / total expenses) * 100.
+    Batched version of signal(): scales every row of df and predicts them in one call.
+    Returns one prediction per row (all 0 if the sector has no model, same as signal()).
     """
-    # Download historical daily data from the start date.
-    df = fetch_adjusted_df(ticker, start, end)
-    if df.empty:
-        return None
-    df = data.process_data(df)
-    sector = trainer.get_ticker_sector(ticker, sectors)
+    if len(df) == 0:
+        # e.g. a history too short for process_data to keep any rows; the models reject 0 samples
+        return np.zeros(0)
+    if sector not in STOCK_SECTORS:
+        sector = "Unknown"
+    model, scaler = _load_model(sector)
+    if model is None:
+        print(f"[ERROR] Model or scaler for sector '{sector}' not found.")
+        return np.zeros(len(df))
+    # float32 halves the memory traffic through the scaler and the model's matmuls
+    X_scaled = trainer.standardize(df[FEATURE_COLS].to_numpy(dtype=np.float32), *scaler, parallel=False)
+    return model.predict(X_scaled)
 
-    df['Date'] = df['Date'].dt.strftime("%Y-%m-%d")
 
+@njit(cache=True)
+def _simulate_loop(prices, preds):
+    """
+    Portfolio loop of simulate() on plain float arrays (one price and one prediction per day).
+    Returns (expenses, cash) after selling any remaining shares on the last day.
+    """
     # Portfolio variables:
     holding = 0.0  # number of shares currently held
     cash = 0.0  # cash balance (from sales)
     expenses = 0.0  # total money injected (i.e. cost basis)
 
-    last_price = None  # will hold the previous day's price for computing daily change
+    # previous day's price for computing daily change (first day has no change)
+    last_price = prices[0] if len(prices) > 0 else 0.0
 
-    for i, row in df.iterrows():
-        date = row['Date']
-        price = row['Adj Close']
-        if last_price is None:
-            last_price = price
+    for i in range(len(prices)):
+        price = prices[i]
 
         # Compute daily percent gain
-        daily_pct_gain = ((price - last_price) / last_price) * 100 if last_price != 0 else 0
+        daily_pct_gain = ((price - last_price) / last_price) * 100 if last_price != 0 else 0.0
 
-        # Get the model’s prediction signal for this day.
-        pred = signal(ticker, sector, df, date)
+        pred = preds[i]
 
         if holding > 0:
             if pred >= 0:
@@ -167,11 +290,11 @@ def simulate(ticker, start, end):
                 # If prediction is neutral or negative, sell all shares.
                 proceeds = holding * price
                 cash += proceeds
-                holding = 0
+                holding = 0.0
         else:
             if pred >= 0:
                 # If not holding any shares and the prediction is positive, buy $1000 worth.
-                cost = 1000
+                cost = 1000.0
                 if cash < cost:
                     needed = cost - cash
                     cash += needed
@@ -184,20 +307,74 @@ def simulate(ticker, start, end):
 
     # At the simulation’s end, sell any remaining shares.
     if holding > 0:
-        final_price = df.iloc[-1]['Adj Close']
+        final_price = prices[-1]
         proceeds = holding * final_price
         cash += proceeds
-        holding = 0
+        holding = 0.0
+
+    return expenses, cash
+
+
+def simulate(ticker, df: pd.DataFrame):
+    """
+    Simulates day-by-day trades for a given ticker over the downloaded price history
+    (see fetch_adjusted_batch / fetch_adjusted_df).
+
+    Trading Rules:
+      1) If already holding shares:
+         a) If the model prediction is positive, buy additional shares equal to:
+                current_shares * (daily_pct_gain / 100)
+            (e.g. a 20% gain means buying 20% more shares)
+         b) If the prediction is negative, sell all shares.
+      2) If not holding shares:
+         a) If the prediction is positve, buy $1000 worth of shares.
+         b) Otherwise, do nothing.
+      3) If there isn’t enough cash to cover a purchase, “inject” the extra cash and add it to expenses.
+
+    At the end of the simulation any remaining shares are sold.
+    The function returns the profit percentage calculated as:
+         ((final cash - total expenses) / total expenses) * 100.
+    """
+    if df.empty:
+        return None
+    df = data.process_data(df)
+    sector = trainer.get_ticker_sector(ticker)
+
+    # Get the model’s prediction signal for every day at once.
+    preds = np.asarray(signals(sector, df), dtype=np.float64)
+    prices = df['Adj Close'].to_numpy(dtype=np.float64)
+
+    expenses, cash = _simulate_loop(prices, preds)
 
     # Compute the profit percentage.
     profit_pct = ((cash - expenses) / expenses * 100) if expenses > 0 else 0
     return [expenses, cash, profit_pct]
 
 
-def backTest(tickers, start, end):
-    profit_pcts = {}
-    for ticker in tickers:
-        profit_pcts[ticker] = simulate(ticker, start, end)
+def _compile_kernels():
+    """
+    Runs each numba kernel once so it is compiled and written to its on-disk cache
+    (cache=True) before worker processes start; workers then load it instead of each
+    compiling it again. Only serial kernels: a parallel one would start numba's thread
+    pool here, which the forked workers can't use (and which keeps the interpreter from exiting).
+    """
+    _simulate_loop(np.ones(1), np.zeros(1))
+    data._wilder(np.ones(1), 14)
+    trainer.standardize(np.ones((1, 1)), np.zeros(1, np.float32), np.ones(1, np.float32), parallel=False)
+
+
+def backTest(tickers, start, end, max_workers=None):
+    """
+    Runs simulate() for every ticker in parallel worker processes.
+    Each worker loads its own copy of the models (lru_cache isn't shared across processes).
+    """
+    frames = fetch_adjusted_batch(tickers, start, end)
+    # Resolve (and save) sectors up front so workers only ever read the ticker cache
+    trainer.fetch_ticker_sectors(tickers)
+    _compile_kernels()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(simulate, tickers, [frames[ticker] for ticker in tickers])
+        profit_pcts = dict(zip(tickers, results))
     return profit_pcts
 
 
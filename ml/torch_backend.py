@@ -0,0 +1,88 @@
+# ml/torch_backend.py
+# Optional PyTorch training backend (TRAINING_BACKEND=torch); only imported when selected.
+import numpy as np
+import torch
+from torch import nn
+
+
+class TorchMLP:
+    """
+    Same network as the sklearn model (relu hidden layers + adam), trained with PyTorch
+    on the GPU when one is available (bf16 autocast on CUDA).
+    Exposes fit / predict / n_iter_ / classes_ like MLPClassifier, and keeps its weights
+    on the CPU after training so it joblib-pickles and predicts without a GPU.
+    """
+
+    def __init__(self, hidden_layer_sizes=(100, 50), alpha=0.0001, learning_rate_init=0.001,
+                 batch_size=4096, max_iter=500, tol=1e-4, n_iter_no_change=10, random_state=42):
+        self.hidden_layer_sizes = hidden_layer_sizes
+        self.alpha = alpha
+        self.learning_rate_init = learning_rate_init
+        self.batch_size = batch_size
+        self.max_iter = max_iter
+        self.tol = tol
+        self.n_iter_no_change = n_iter_no_change
+        self.random_state = random_state
+
+    def _build(self, n_features, n_classes):
+        layers = []
+        size = n_features
+        for hidden in self.hidden_layer_sizes:
+            layers += [nn.Linear(size, hidden), nn.ReLU()]
+            size = hidden
+        layers.append(nn.Linear(size, n_classes))
+        return nn.Sequential(*layers)
+
+    def fit(self, X, y):
+        torch.manual_seed(self.random_state)
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.classes_, y_idx = np.unique(y, return_inverse=True)
+
+        model = self._build(X.shape[1], len(self.classes_)).to(device)
+        optimizer = torch.optim.Adam(model.parameters(), lr=self.learning_rate_init)
+        # sklearn's L2 penalty: 0.5 * alpha * sum(W**2) / batch size, on the weights only (no biases)
+        weights = [layer.weight for layer in model if isinstance(layer, nn.Linear)]
+        loss_fn = nn.CrossEntropyLoss()
+        X_t = torch.from_numpy(np.ascontiguousarray(X, dtype=np.float32)).to(device)
+        y_t = torch.from_numpy(y_idx.astype(np.int64)).to(device)
+        n = len(X_t)
+
+        # Stop like MLPClassifier: training loss hasn't improved by tol for n_iter_no_change epochs
+        best_loss = np.inf
+        no_improvement = 0
+        self.n_iter_ = 0
+        for epoch in range(self.max_iter):
+            model.train()
+            epoch_loss = 0.0
+            for batch in torch.randperm(n, device=device).split(self.batch_size):
+                with torch.autocast(device_type=device, dtype=torch.bfloat16, enabled=device == "cuda"):
+                    loss = loss_fn(model(X_t[batch]), y_t[batch])
+                    loss = loss + 0.5 * self.alpha * sum((w ** 2).sum() for w in weights) / len(batch)
+                optimizer.zero_grad()
+                loss.backward()
+                optimizer.step()
+                epoch_loss += loss.item() * len(batch)
+            epoch_loss /= n
+            self.n_iter_ = epoch + 1
+
+            if epoch_loss > best_loss - self.tol:
+                no_improvement += 1
+                if no_improvement >= self.n_iter_no_change:
+                    break
+            else:
+                no_improvement = 0
+            best_loss = min(best_loss, epoch_loss)
+
+        self.model_ = model.cpu().eval()
+        return self
+
+    def predict(self, X):
+        # One intra-op thread, like predictor._OnnxModel: backTest already runs one process per core
+        threads = torch.get_num_threads()
+        torch.set_num_threads(1)
+        try:
+            with torch.no_grad():
+                logits = self.model_(torch.from_numpy(np.ascontiguousarray(X, dtype=np.float32)))
+        finally:
+            torch.set_num_threads(threads)
+        return self.classes_[logits.argmax(dim=1).numpy()]
@@ -1,15 +1,30 @@
 # ml/trainer.py
+import atexit
+import hashlib
+import inspect
 import joblib
 import os
-import pandas as pd
-from sklearn.model_selection import train_test_split
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor
+from joblib import Memory, Parallel, delayed
+from threadpoolctl import threadpool_limits
+
+# Optional: route supported estimators through Intel's oneDAL (must run before sklearn imports).
+# Anything sklearnex doesn't accelerate keeps using stock scikit-learn.
+try:
+    from sklearnex import patch_sklearn
+    patch_sklearn()
+except ImportError:
+    pass
+
 from sklearn.neural_network import MLPClassifier
-from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import accuracy_score, confusion_matrix, classification_report
-import yfinance as yf
-from yfinance.domain import sector
 
-from ml.data import load_and_process
+from ml import kernels
+from ml._njit import get_num_threads, set_num_threads
+from ml.data import CACHE_DIR, load_and_process, memory as data_memory
 
 # ------------------
 # Global Definitions
@@ -55,6 +70,19 @@ RAW_DIR = "data/raw"
 DF_DIR = "data/DF"
 MODELS_DIR = "Models"
 TICKER_INFO_CACHE_PATH = "data/ticker_info_cache.joblib"
+# Process-wide ticker -> sector dict (see get_ticker_cache); _DIRTY marks unsaved additions
+_TICKER_CACHE = None
+_DIRTY = False
+# Sentinel for cache misses (a cached value is never this object)
+_MISSING = object()
+# zlib level 3: much smaller files for dense numeric data at a modest write cost;
+# pickle protocol 5 avoids extra copies of NumPy buffers. joblib.load detects both.
+JOBLIB_COMPRESS = 3
+JOBLIB_PROTOCOL = 5
+# Split + scaled training arrays; cached arrays are loaded back memory-mapped
+training_memory = Memory(os.path.join(CACHE_DIR, "training"), mmap_mode='r', verbose=0)
+# "sklearn" (MLPClassifier) or "torch" (ml.torch_backend.TorchMLP, uses CUDA when available)
+TRAINING_BACKEND = os.environ.get("TRAINING_BACKEND", "sklearn")
 
 
 # ------------------
@@ -75,70 +103,208 @@ def save_ticker_info_cache(cache_dict):
     """
     Saves the ticker -> sector dictionary to joblib.
     """
-    joblib.dump(cache_dict, TICKER_INFO_CACHE_PATH)
+    joblib.dump(cache_dict, TICKER_INFO_CACHE_PATH, compress=JOBLIB_COMPRESS, protocol=JOBLIB_PROTOCOL)
 
 
-def get_ticker_sector(ticker, ticker_cache):
+def get_ticker_cache():
+    """
+    The in-memory ticker -> sector dict shared by this process, loaded from disk on first use.
+    New entries are written back once, at exit (or by fetch_ticker_sectors).
+    """
+    global _TICKER_CACHE
+    if _TICKER_CACHE is None:
+        _TICKER_CACHE = load_ticker_info_cache()
+    return _TICKER_CACHE
+
+
+@atexit.register
+def _flush_ticker_cache():
+    global _DIRTY
+    if _DIRTY:
+        save_ticker_info_cache(_TICKER_CACHE)
+        _DIRTY = False
+
+
+def _lookup_sector(ticker, yf_ticker=None):
+    """
+    Asks yfinance for a ticker's sector, falling back to "Unknown" if it has none or
+    Yahoo answers 404. Any other error (e.g. a 429 rate limit) is raised.
     """
-       Fetches the sector for a given ticker.
-       If the ticker is in the cache, return immediately.
-       Otherwise, attempt a yfinance call, handle exceptions,
-       and store the result (or "Unknown") in the cache.
-       """
-    if ticker in ticker_cache:
-        return ticker_cache[ticker]
     sector = "Unknown"
     try:
         # Attempt yfinance call
-        sector_candidate = yf.Ticker(ticker).info.get("sector")
+        if yf_ticker is None:
+            import yfinance as yf  # imported on first use; see fetch_ticker_sectors
+            yf_ticker = yf.Ticker(ticker)
+        sector_candidate = yf_ticker.info.get("sector")
         if sector_candidate is not None:
             sector = sector_candidate
     except Exception as e:
-        # If there's a 404 or any other error, fallback to "Unknown"
-        if "404" in str(e):
-            print(f"[WARNING] 404 error for ticker '{ticker}'. Marking sector as 'Unknown'.")
-        else:
-            print(f"[WARNING] Failed to fetch sector for ticker '{ticker}': {e}")
-            quit(1)
+        # A 404 means Yahoo doesn't know the ticker: fallback to "Unknown"
+        if "404" not in str(e):
+            raise
+        print(f"[WARNING] 404 error for ticker '{ticker}'. Marking sector as 'Unknown'.")
+    return sector
+
+
+def _fetch_sector(ticker, yf_ticker=None):
+    """
+    _lookup_sector(), exiting on any error other than a 404.
+    """
+    try:
+        return _lookup_sector(ticker, yf_ticker)
+    except Exception as e:
+        print(f"[WARNING] Failed to fetch sector for ticker '{ticker}': {e}")
+        quit(1)
+
+
+def get_ticker_sector(ticker, ticker_cache=None):
+    """
+       Fetches the sector for a given ticker.
+       If the ticker is in the cache (default: get_ticker_cache()), return immediately.
+       Otherwise, attempt a yfinance call, handle exceptions,
+       and store the result (or "Unknown") in the cache.
+       The cache is not saved to disk here; the shared one is flushed at exit.
+       """
+    global _DIRTY
+    if ticker_cache is None:
+        ticker_cache = get_ticker_cache()
+    cached = ticker_cache.get(ticker, _MISSING)
+    if cached is not _MISSING:
+        return cached
+    sector = _fetch_sector(ticker)
     ticker_cache[ticker] = sector
-    save_ticker_info_cache(ticker_cache)
+    if ticker_cache is _TICKER_CACHE:
+        _DIRTY = True
     return sector
 
 
+def fetch_ticker_sectors(tickers, ticker_cache=None, max_workers=16):
+    """
+    Fills ticker_cache (default: get_ticker_cache()) with the sectors of every ticker it doesn't have yet.
+    The yfinance lookups are network-bound, so they run on a thread pool,
+    and the cache is saved to disk once at the end instead of after every miss.
+    If any lookup fails (other than a 404), the successful ones are saved first, then it exits.
+    """
+    global _DIRTY
+    if ticker_cache is None:
+        ticker_cache = get_ticker_cache()
+    missing = [t for t in dict.fromkeys(tickers) if t not in ticker_cache]
+    if not missing:
+        return ticker_cache
+    print(f"[INFO] Fetching sectors for {len(missing)} tickers...")
+    # yfinance (and requests, lxml, ...) is only imported once a lookup is actually needed,
+    # so training runs with a warm cache start faster
+    import yfinance as yf
+    tickers_obj = yf.Tickers(" ".join(missing))
+
+    def lookup(ticker):
+        # (sector, None) or (None, error): one failure mustn't discard the other lookups
+        try:
+            return _lookup_sector(ticker, tickers_obj.tickers.get(ticker.upper())), None
+        except Exception as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(lookup, missing))
+    failed = []
+    for ticker, (sector, error) in zip(missing, results):
+        if error is None:
+            ticker_cache[ticker] = sector
+        else:
+            failed.append((ticker, error))
+    save_ticker_info_cache(ticker_cache)
+    if ticker_cache is _TICKER_CACHE:
+        _DIRTY = False
+    if failed:
+        for ticker, error in failed:
+            print(f"[WARNING] Failed to fetch sector for ticker '{ticker}': {error}")
+        quit(1)
+    return ticker_cache
+
+
 # ------------------
 # Function 1: Process DataFrames
 # ------------------
 
-def process_dataframes():
+def sector_df_path(sector):
+    return os.path.join(DF_DIR, f"{sector}.parquet")
+
+
+def sector_xy_paths(sector):
+    """
+    Paths of the training arrays saved next to each sector frame:
+    X (FEATURE_COLS order, float32) and y (Target).
+    """
+    return os.path.join(DF_DIR, f"{sector}_X.npy"), os.path.join(DF_DIR, f"{sector}_y.npy")
+
+
+def has_training_data(sector):
+    return all(os.path.exists(path) for path in sector_xy_paths(sector))
+
+
+def process_dataframes(save_frames=False):
     """
     Reads all CSV files from RAW_DIR, determines each ticker's sector,
     loads/cleans the data
-    then groups data by sector and saves each sector to DF_DIR.
+    then groups data by sector and saves each sector's training arrays to DF_DIR
+    (see sector_xy_paths). Training only reads those; save_frames=True also writes the
+    full sector table (every column, plus Ticker) to sector_df_path() for inspection.
     """
     print("[INFO] Starting data processing step...")
-    ticker_cache = load_ticker_info_cache()
+    ticker_cache = get_ticker_cache()
     sector_frames = {sector: [] for sector in STOCK_SECTORS}
-
-    for file in os.listdir(RAW_DIR):
-        if file.endswith(".csv"):
-            ticker = os.path.splitext(file)[0]
-            filepath = os.path.join(RAW_DIR, file)
-            print(f"[INFO] Processing {ticker} from {file}...")
-            sector = get_ticker_sector(ticker, ticker_cache)
-            if sector not in sector_frames:
-                sector = "Unknown"
-            tickerFrame = load_and_process(filepath)
-            tickerFrame['Ticker'] = ticker
-            sector_frames[sector].append(tickerFrame)
+    # Tickers whose sector isn't in STOCK_SECTORS go to "Unknown" (one dict.get per file)
+    get_bucket = sector_frames.get
+    unknown_frames = sector_frames["Unknown"]
+
+    # (ticker, path) for every CSV; scandir's entries carry the name and file type, so no extra stat calls
+    with os.scandir(RAW_DIR) as entries:
+        csv_files = [(entry.name[:-4], entry.path) for entry in entries
+                     if entry.is_file() and entry.name.endswith(".csv")]
+    # Look up every uncached sector in one batch (saves the cache once)
+    fetch_ticker_sectors([ticker for ticker, _ in csv_files], ticker_cache)
+
+    for ticker, filepath in csv_files:
+        print(f"[INFO] Processing {ticker} from {filepath}...")
+        bucket = get_bucket(get_ticker_sector(ticker, ticker_cache), unknown_frames)
+        tickerFrame = load_and_process(filepath)
+        tickerFrame['Ticker'] = ticker
+        bucket.append(pa.Table.from_pandas(tickerFrame, preserve_index=False))
 
     # combine & save sectors:
-    for sector, frames in sector_frames.items():
-        df_sector = pd.concat(frames, ignore_index=True)
-        df_sector.sort_values(by=['Ticker', 'Date'], inplace=True)
-        filename = f"{sector}.joblib"
-        save_path = os.path.join(DF_DIR, filename)
-        joblib.dump(df_sector, save_path)
-        print(f"[INFO] Saved {filename} to {save_path}.")
+    os.makedirs(DF_DIR, exist_ok=True)
+    for sector, tables in sector_frames.items():
+        if not tables:
+            print(f"[WARNING] No tickers found for sector '{sector}'.")
+            continue
+        # Concatenating Arrow tables only links their chunks; the sort runs in Arrow's C++ kernels.
+        # "permissive" unifies e.g. an int64 Volume in one file with a double one in another.
+        table = pa.concat_tables(tables, promote_options="permissive")
+        table = table.sort_by([('Ticker', 'ascending'), ('Date', 'ascending')])
+        # float32 halves the files (and later the training matrix); ample precision for these features
+        table = table.cast(pa.schema([
+            field.with_type(pa.float32()) if pa.types.is_floating(field.type) else field
+            for field in table.schema
+        ]))
+        if save_frames:
+            save_path = sector_df_path(sector)
+            pq.write_table(table, save_path, compression='zstd')
+            print(f"[INFO] Saved {sector} to {save_path}.")
+        # Training only needs the feature matrix and target, stored as plain arrays it can memory-map
+        X_path, y_path = sector_xy_paths(sector)
+        X = np.empty((table.num_rows, len(FEATURE_COLS)), dtype=np.float32)
+        for j, col in enumerate(FEATURE_COLS):
+            X[:, j] = table.column(col).to_numpy()
+        np.save(X_path, X)
+        np.save(y_path, table.column('Target').to_numpy())
+        print(f"[INFO] Saved {sector} to {X_path} and {y_path}.")
+
+    # Drop cache entries that can't be hit again, so cache/ doesn't grow with every reprocess:
+    # splits of the arrays just rewritten, and processed CSVs older than the current files
+    # (every current CSV was just loaded, so it is among the most recently used entries)
+    _split_and_scale.clear(warn=False)
+    data_memory.reduce_size(items_limit=len(csv_files))
     print("[INFO] Finished data processing step.")
 
 
@@ -146,39 +312,132 @@ def process_dataframes():
 # Function 2: Train Model
 # ------------------
 
-def train_model(sector):
-    df_path = os.path.join(DF_DIR, f"{sector}.joblib")
-    print(f"[INFO] Loading {df_path}...")
-    df_sector = joblib.load(df_path)
-    print(f"[INFO] Finished loading {df_path}.")
+def fit_scaler(X):
+    """
+    Per-feature mean and standard deviation of X (what StandardScaler stores), as float32.
+    Zero-variance features get sigma = 1.
+    """
+    return kernels.column_stats(np.ascontiguousarray(X, dtype=np.float32))
+
+
+def standardize(X, mu, sigma, parallel=True):
+    """
+    (X - mu) / sigma as a new float32 array; parallel=False uses the single-threaded kernel.
+    """
+    kernel = kernels.standardize if parallel else kernels.standardize_serial
+    return kernel(np.ascontiguousarray(X, dtype=np.float32), mu, sigma)
+
+
+def stratified_split(X, y, test_size=0.2, seed=42):
+    """
+    Stratified train/test split: each class contributes test_size of its rows to the test set.
+    Rows keep their original order within each split (sorted indices also read the
+    memory-mapped X sequentially). Returns X_train, X_test, y_train, y_test.
+    """
+    classes, inverse = np.unique(y, return_inverse=True)
+    rng = np.random.default_rng(seed)
+    train_idx, test_idx = [], []
+    for c in range(len(classes)):
+        idx = rng.permutation(np.flatnonzero(inverse == c))
+        k = int(len(idx) * test_size)
+        test_idx.append(idx[:k])
+        train_idx.append(idx[k:])
+    train_idx = np.sort(np.concatenate(train_idx))
+    test_idx = np.sort(np.concatenate(test_idx))
+    return X[train_idx], X[test_idx], y[train_idx], y[test_idx]
+
+
+# joblib.Memory only fingerprints _split_and_scale's own source, so changes to the helpers it
+# calls (and the numba kernels behind them) must invalidate cached splits too. Hashes just those,
+# not all of trainer.py, so that editing train_model's hyperparameters still reuses the cache.
+_SPLIT_HASH = hashlib.md5(
+    "".join(inspect.getsource(f) for f in (stratified_split, fit_scaler, standardize)).encode()
+    + inspect.getsource(kernels).encode()
+).hexdigest()
+
+
+@training_memory.cache
+def _split_and_scale(X_path, y_path, mtimes, split_hash):
+    """
+    Train/test split + scaling for one sector's arrays. Cached on disk keyed by the file
+    paths and modification times (plus _SPLIT_HASH), so re-training with new MLP
+    hyperparameters skips it.
+    Returns (X_train_scaled, X_test_scaled, y_train, y_test, mu, sigma).
+    """
+    # X is memory-mapped read-only (float32, FEATURE_COLS order): pages come from the OS cache
+    # and are shared between parallel trainings; the split below copies only the rows it needs
+    X = np.load(X_path, mmap_mode='r')
+    y = np.load(y_path)
 
     # Train/Test Split + Scaling(Note: Consider Log scaling)
-    X = df_sector[FEATURE_COLS]
-    y = df_sector['Target']
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
+    X_train, X_test, y_train, y_test = stratified_split(X, y, test_size=0.2, seed=42)
+    mu, sigma = fit_scaler(X_train)
+    return standardize(X_train, mu, sigma), standardize(X_test, mu, sigma), y_train, y_test, mu, sigma
+
+
+def export_onnx(model, path):
+    """
+    Exports a fitted MLPClassifier's forward pass to ONNX at path, for predictor's onnxruntime path.
+    Returns False (nothing written) if skl2onnx isn't installed.
+    """
+    try:
+        from skl2onnx import convert_sklearn
+        from skl2onnx.common.data_types import FloatTensorType
+    except ImportError:
+        return False
+    onx = convert_sklearn(
+        model,
+        initial_types=[('X', FloatTensorType([None, len(FEATURE_COLS)]))],
+        # plain label/probability tensors instead of a list of {class: probability} dicts
+        options={id(model): {'zipmap': False}},
     )
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
+    with open(path, 'wb') as f:
+        f.write(onx.SerializeToString())
+    return True
+
+
+def train_model(sector):
+    X_path, y_path = sector_xy_paths(sector)
+    print(f"[INFO] Loading {X_path}...")
+    mtimes = (os.path.getmtime(X_path), os.path.getmtime(y_path))
+    X_train_scaled, X_test_scaled, y_train, y_test, mu, sigma = _split_and_scale(X_path, y_path, mtimes, _SPLIT_HASH)
+    print(f"[INFO] Finished loading {X_path}.")
+    # C-contiguous float32 X and integer labels, so fit/predict never copy or convert internally
+    # (no-ops for X: standardize already returns that layout)
+    X_train_scaled = np.ascontiguousarray(X_train_scaled, dtype=np.float32)
+    X_test_scaled = np.ascontiguousarray(X_test_scaled, dtype=np.float32)
+    y_train = np.ascontiguousarray(y_train, dtype=np.int32)
+    y_test = np.ascontiguousarray(y_test, dtype=np.int32)
 
     '''
     My Little Pony: Classifier is magic!
     [ Define the MLPClassifier model ]
     [ Adjust Layer Sizes & Other Hyperparameters ] 
     '''
-    myLittlePony = MLPClassifier(
-        # 100 neurons for a broad set of features, 50 to refine them into abstract representation.
-        hidden_layer_sizes=(100, 50),
-        # Computationally simple + mitigates the vanishing gradient problem
-        activation="relu",
-        solver="adam",
-        # Can't be too restrictive with something as volatile as stocks but still need to prevent overfitting
-        alpha=0.0001,
-        learning_rate='adaptive',
-        max_iter=500,
-        random_state=42
-    )
+    if TRAINING_BACKEND == "torch":
+        from ml.torch_backend import TorchMLP
+        # Same architecture and penalty as below, trained on the GPU
+        myLittlePony = TorchMLP(hidden_layer_sizes=(100, 50), alpha=0.0001, max_iter=500, random_state=42)
+    else:
+        myLittlePony = MLPClassifier(
+            # 100 neurons for a broad set of features, 50 to refine them into abstract representation.
+            hidden_layer_sizes=(100, 50),
+            # Computationally simple + mitigates the vanishing gradient problem
+            activation="relu",
+            solver="adam",
+            # Can't be too restrictive with something as volatile as stocks but still need to prevent overfitting
+            alpha=0.0001,
+            learning_rate='adaptive',
+            batch_size=min(256, len(X_train_scaled)),
+            max_iter=500,
+            # Stop once the score on a held-out 10% of the training set stops improving
+            # instead of always running to max_iter
+            early_stopping=True,
+            validation_fraction=0.1,
+            n_iter_no_change=10,
+            tol=1e-4,
+            random_state=42
+        )
 
     # Train the model:
     myLittlePony.fit(X_train_scaled, y_train)
@@ -196,39 +455,52 @@ def train_model(sector):
     # Save the trained model and the scaler for this sector.
     os.makedirs(MODELS_DIR, exist_ok=True)
     model_path = os.path.join(MODELS_DIR, f"{sector}.joblib")
-    scaler_path = os.path.join(MODELS_DIR, f"{sector}_scaler.joblib")
-    joblib.dump(myLittlePony, model_path)
-    joblib.dump(scaler, scaler_path)
+    scaler_path = os.path.join(MODELS_DIR, f"{sector}_scaler.npz")
+    joblib.dump(myLittlePony, model_path, compress=JOBLIB_COMPRESS, protocol=JOBLIB_PROTOCOL)
+    np.savez(scaler_path, mu=mu, sigma=sigma)
+    # The predictor prefers the ONNX copy, so never leave one from an older model behind
+    onnx_path = os.path.join(MODELS_DIR, f"{sector}.onnx")
+    if isinstance(myLittlePony, MLPClassifier) and export_onnx(myLittlePony, onnx_path):
+        print(f"[INFO] Saved ONNX model for '{sector}' to '{onnx_path}'")
+    elif os.path.exists(onnx_path):
+        os.remove(onnx_path)
 
     print(f"[INFO] Saved MLP model for '{sector}' to '{model_path}'")
     print(f"[INFO] Saved scaler for '{sector}' to '{scaler_path}'")
 
 
+def _train_model_single_threaded(sector):
+    # Each sector trains in its own process; one BLAS thread each avoids oversubscribing the cores.
+    # threadpoolctl doesn't cover numba, so its parallel kernels (fit_scaler/standardize) get capped too
+    numba_threads = get_num_threads()
+    set_num_threads(1)
+    try:
+        with threadpool_limits(limits=1):
+            train_model(sector)
+    finally:
+        set_num_threads(numba_threads)
+
+
 def main():
     processed_sectors = []
-    trained_sectors = []
-    already_reprocessed = False  # Until I eventually store the data better
 
-    for sector in STOCK_SECTORS:
-        model_path = os.path.join(MODELS_DIR, f"{sector}.joblib")
-        df_path = os.path.join(DF_DIR, f"{sector}.joblib")
+    # Skip sectors whose model already exists
+    untrained = [s for s in STOCK_SECTORS if not os.path.exists(os.path.join(MODELS_DIR, f"{s}.joblib"))]
 
-        # Skip if the model already exists
-        if os.path.exists(model_path):
-            continue
+    # If any processed dataframe does not exist, reprocess the data once.
+    if any(not has_training_data(s) for s in untrained):
+        process_dataframes()  # Until I eventually store the data better
+
+    sectors_to_train = []
+    for sector in untrained:
+        if has_training_data(sector):
+            sectors_to_train.append(sector)
+        else:
+            print(f"[WARNING] Dataframe for sector '{sector}' is missing, even after reprocessing.")
 
-        # If the processed dataframe does not exist, reprocess the data once.
-        if not os.path.exists(df_path):
-            if not already_reprocessed:
-                process_dataframes()
-                already_reprocessed = True
-            else:
-                print(f"[WARNING] Dataframe for sector '{sector}' is missing, even after reprocessing.")
-                continue  # Optionally, skip training if the data is missing
-
-        # Train the model for this sector
-        train_model(sector)
-        trained_sectors.append(sector)
+    # Sectors are independent, so train them in parallel
+    Parallel(n_jobs=-1, backend='loky')(delayed(_train_model_single_threaded)(s) for s in sectors_to_train)
+    trained_sectors = sectors_to_train
 
     output = []
     if processed_sectors: